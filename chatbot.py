@@ -1,7 +1,125 @@
+import os
 import sqlite3
 import pandas as pd
 import re
-from typing import List, Dict, Any
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple
+
+# Number of answered questions kept in memory per chatbot
+QUERY_CACHE_SIZE = 128
+
+# Columns the chatbot can filter, group and list by
+ENTITY_COLUMNS = ['company', 'region', 'customer', 'plant']
+
+# Query shapes behind QUERY_TABLE; {col} is one of ENTITY_COLUMNS and
+# {budget} the numeric expression for the main budget column.
+# Values are bound as parameters, so each shape compiles to one statement.
+NON_EMPTY = "{col} IS NOT NULL AND {col} NOT IN (?, ?)"
+EMPTY_VALUES = ('0', '')  # Bound to the NOT IN placeholders of NON_EMPTY
+SQL_COUNT_ALL = "SELECT COUNT(*) as count FROM {table}"
+SQL_COUNT_NON_EMPTY = f"SELECT COUNT(*) as count FROM {{table}} WHERE {NON_EMPTY}"
+SQL_COUNT_BY = f"SELECT {{col}}, COUNT(*) as count FROM {{table}} WHERE {NON_EMPTY} GROUP BY {{col}} ORDER BY count DESC"
+SQL_SUM_ALL = "SELECT SUM({budget}) as total FROM {table}"
+SQL_SUM_BY = f"SELECT {{col}}, SUM({{budget}}) as total FROM {{table}} WHERE {NON_EMPTY} GROUP BY {{col}} ORDER BY total DESC"
+SQL_AVG_ALL = "SELECT AVG({budget}) as average FROM {table}"
+SQL_AVG_BY = f"SELECT {{col}}, AVG({{budget}}) as average FROM {{table}} WHERE {NON_EMPTY} GROUP BY {{col}} ORDER BY average DESC"
+SQL_MAX = "SELECT *, MAX({budget}) as max_value FROM {table}"
+SQL_MIN = "SELECT *, MIN({budget}) as min_value FROM {table} WHERE {budget} > ?"
+SQL_DISTINCT = f"SELECT DISTINCT {{col}} FROM {{table}} WHERE {NON_EMPTY} ORDER BY {{col}}"
+SQL_SAMPLE_ROWS = "SELECT * FROM {table} LIMIT 10"
+SQL_FIRST_ROW = "SELECT * FROM {table} LIMIT 1"
+
+# Question keywords per intent, in the order the intents take precedence
+INTENT_KEYWORDS = [
+    ('count', ['count', 'how many', 'number of']),
+    ('sum', ['total', 'sum', 'amount']),
+    ('avg', ['average', 'avg', 'mean']),
+    ('select', ['list', 'show', 'display', 'get']),
+    ('max', ['maximum', 'max', 'highest', 'largest']),
+    ('min', ['minimum', 'min', 'lowest', 'smallest']),
+]
+_INTENT_RANK = {keyword: rank for rank, (_, keywords) in enumerate(INTENT_KEYWORDS) for keyword in keywords}
+
+# Entities each intent understands, in order of precedence:
+# (entity, phrase that selects it, phrases that ask for a grouped result)
+INTENT_ENTITIES = {
+    'count': [
+        ('company', 'company', ('by company', 'per company')),
+        ('region', 'region', ('by region', 'per region')),
+        ('project', 'project', ()),
+        ('customer', 'customer', ('by customer',)),
+    ],
+    'sum': [
+        ('company', 'by company', ('by company',)),
+        ('region', 'by region', ('by region',)),
+    ],
+    'avg': [
+        ('company', 'by company', ('by company',)),
+        ('region', 'by region', ('by region',)),
+    ],
+    'select': [(col, col, ()) for col in ENTITY_COLUMNS],
+}
+
+# (intent, entity, grouped) -> key of the rendered query in _build_queries
+QUERY_TABLE = {
+    ('count', '', False): ('count', ''),
+    ('count', 'project', False): ('count', ''),
+    **{('count', col, False): ('count', col) for col in ('company', 'region', 'customer')},
+    **{('count', col, True): ('count_by', col) for col in ('company', 'region', 'customer')},
+    ('sum', '', False): ('sum', ''),
+    ('avg', '', False): ('avg', ''),
+    **{(intent, col, True): (f'{intent}_by', col) for intent in ('sum', 'avg') for col in ('company', 'region')},
+    ('select', '', False): ('sample', ''),
+    **{('select', col, False): ('distinct', col) for col in ENTITY_COLUMNS},
+    ('max', '', False): ('max', ''),
+    ('min', '', False): ('min', ''),
+    ('general', '', False): ('sample', ''),
+}
+# Budget queries fall back to these when the table has no budget column
+QUERY_FALLBACK = {'sum': ('count', ''), 'avg': ('count', ''), 'max': ('first', ''), 'min': ('first', '')}
+
+_QUESTION_PHRASES = set(_INTENT_RANK) | {
+    phrase
+    for entities in INTENT_ENTITIES.values()
+    for _, trigger, group_phrases in entities
+    for phrase in (trigger, *group_phrases)
+}
+# A lookahead reports overlapping phrases too, so one scan finds every substring hit
+_QUESTION_PATTERN = re.compile(
+    '(?=(' + '|'.join(re.escape(p) for p in sorted(_QUESTION_PHRASES, key=len, reverse=True)) + '))'
+)
+
+def tune_connection(conn: sqlite3.Connection, cache_size: int = -65536) -> sqlite3.Connection:
+    """
+    Apply read-heavy SQLite settings to a freshly opened connection.
+    Only connection-level settings: nothing here writes to the database file,
+    so read-only databases work (WAL mode is set once when the database is built)
+    """
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")  # 256 MB
+    conn.execute(f"PRAGMA cache_size={int(cache_size)}")  # negative = KiB, default 64 MB
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+@lru_cache(maxsize=None)
+def _load_table_schema(db_path: str, table_name: str) -> Tuple[Tuple[str, str], ...]:
+    """
+    Read the table schema once per database file and table
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"PRAGMA table_info({table_name})")
+        columns = cursor.fetchall()
+        if not columns:
+            # Raise rather than return, so a database that is not built yet is not cached as empty
+            raise sqlite3.OperationalError(f"no such table: {table_name}")
+        # column_name: data_type
+        return tuple((col[1].lower(), col[2]) for col in columns)
+    finally:
+        conn.close()
 
 class InvestmentDataChatbot:
     def __init__(self, db_path: str = 'investment_data_careful.db'):
@@ -10,163 +128,142 @@ class InvestmentDataChatbot:
         """
         self.db_path = db_path
         self.table_name = 'investment_projects'
+        self._conn = tune_connection(sqlite3.connect(self.db_path, check_same_thread=False))
         self.schema = self._get_table_schema()
+        self._budget_cols = tuple(col for col in self.schema if any(k in col for k in ('budget', 'total', 'value')))
+        self._main_budget_col = self._budget_cols[0] if self._budget_cols else None  # Use first budget column found
+        self._queries = self._build_queries()
+        self._cache: "OrderedDict[Tuple[str, Tuple[float, int]], Tuple[str, Tuple[Any, ...], pd.DataFrame]]" = OrderedDict()
+        # Paraphrased questions map to the same SQL, so results are also cached per query
+        self._result_cache: "OrderedDict[Tuple[str, Tuple[Any, ...], Tuple[float, int]], pd.DataFrame]" = OrderedDict()
         
     def _get_table_schema(self) -> Dict[str, str]:
         """
         Get the table schema for better query generation
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute(f"PRAGMA table_info({self.table_name})")
-            columns = cursor.fetchall()
-            
-            schema = {}
-            for col in columns:
-                schema[col[1].lower()] = col[2]  # column_name: data_type
-            
-            conn.close()
-            return schema
+            return dict(_load_table_schema(self.db_path, self.table_name))
             
         except Exception as e:
             print(f"Error getting schema: {e}")
             return {}
     
-    def _natural_language_to_sql(self, question: str) -> str:
+    def _db_version(self) -> Tuple[float, int]:
         """
-        Convert natural language question to SQL query
-        This is a simplified NLP to SQL converter
+        Identify the current database contents: file mtime plus SQLite's
+        data_version, which also moves on commits still sitting in the WAL
         """
-        question = question.lower().strip()
-        
-        # Common query patterns
-        if any(word in question for word in ['count', 'how many', 'number of']):
-            return self._generate_count_query(question)
-        elif any(word in question for word in ['total', 'sum', 'amount']):
-            return self._generate_sum_query(question)
-        elif any(word in question for word in ['average', 'avg', 'mean']):
-            return self._generate_avg_query(question)
-        elif any(word in question for word in ['list', 'show', 'display', 'get']):
-            return self._generate_select_query(question)
-        elif any(word in question for word in ['maximum', 'max', 'highest', 'largest']):
-            return self._generate_max_query(question)
-        elif any(word in question for word in ['minimum', 'min', 'lowest', 'smallest']):
-            return self._generate_min_query(question)
-        else:
-            return self._generate_general_query(question)
-    
-    def _generate_count_query(self, question: str) -> str:
-        """Generate COUNT queries"""
-        base_query = f"SELECT COUNT(*) as count FROM {self.table_name}"
-        
-        if 'company' in question:
-            if 'by company' in question or 'per company' in question:
-                return f"SELECT company, COUNT(*) as count FROM {self.table_name} WHERE company IS NOT NULL AND company != '0' AND company != '' GROUP BY company ORDER BY count DESC"
-            else:
-                return f"{base_query} WHERE company IS NOT NULL AND company != '0' AND company != ''"
-        
-        elif 'region' in question:
-            if 'by region' in question or 'per region' in question:
-                return f"SELECT region, COUNT(*) as count FROM {self.table_name} WHERE region IS NOT NULL AND region != '0' AND region != '' GROUP BY region ORDER BY count DESC"
-            else:
-                return f"{base_query} WHERE region IS NOT NULL AND region != '0' AND region != ''"
-        
-        elif 'project' in question:
-            return base_query
-        
-        elif 'customer' in question:
-            if 'by customer' in question:
-                return f"SELECT customer, COUNT(*) as count FROM {self.table_name} WHERE customer IS NOT NULL AND customer != '0' AND customer != '' GROUP BY customer ORDER BY count DESC"
-            else:
-                return f"{base_query} WHERE customer IS NOT NULL AND customer != '0' AND customer != ''"
-        
-        return base_query
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        try:
+            mtime = os.path.getmtime(self.db_path)
+        except OSError:
+            # db_path is a URI such as file:...?mode=ro; data_version still tracks changes
+            mtime = 0.0
+        return mtime, data_version
     
-    def _generate_sum_query(self, question: str) -> str:
-        """Generate SUM queries"""
-        # Look for budget-related columns
-        budget_columns = [col for col in self.schema.keys() if 'budget' in col or 'total' in col or 'value' in col]
-        
-        if budget_columns:
-            main_budget_col = budget_columns[0]  # Use first budget column found
-            
-            if 'by company' in question:
-                return f"SELECT company, SUM(CAST({main_budget_col} AS REAL)) as total FROM {self.table_name} WHERE company IS NOT NULL AND company != '0' AND company != '' GROUP BY company ORDER BY total DESC"
-            elif 'by region' in question:
-                return f"SELECT region, SUM(CAST({main_budget_col} AS REAL)) as total FROM {self.table_name} WHERE region IS NOT NULL AND region != '0' AND region != '' GROUP BY region ORDER BY total DESC"
-            else:
-                return f"SELECT SUM(CAST({main_budget_col} AS REAL)) as total FROM {self.table_name}"
+    def _parse_question(self, question: str) -> Tuple[str, str, bool]:
+        """
+        Extract (intent, entity, grouped) from a question with a single scan
+        """
+        found = {match.group(1) for match in _QUESTION_PATTERN.finditer(question)}
         
-        return f"SELECT COUNT(*) as count FROM {self.table_name}"
-    
-    def _generate_avg_query(self, question: str) -> str:
-        """Generate AVG queries"""
-        budget_columns = [col for col in self.schema.keys() if 'budget' in col or 'total' in col or 'value' in col]
+        ranks = {_INTENT_RANK[phrase] for phrase in found if phrase in _INTENT_RANK}
+        if not ranks:
+            return 'general', '', False
+        intent = INTENT_KEYWORDS[min(ranks)][0]
         
-        if budget_columns:
-            main_budget_col = budget_columns[0]
-            
-            if 'by company' in question:
-                return f"SELECT Company, AVG(CAST({main_budget_col} AS REAL)) as average FROM {self.table_name} WHERE Company IS NOT NULL AND Company != '0' GROUP BY Company ORDER BY average DESC"
-            elif 'by region' in question:
-                return f"SELECT Region, AVG(CAST({main_budget_col} AS REAL)) as average FROM {self.table_name} WHERE Region IS NOT NULL AND Region != '0' GROUP BY Region ORDER BY average DESC"
-            else:
-                return f"SELECT AVG(CAST({main_budget_col} AS REAL)) as average FROM {self.table_name}"
+        for entity, trigger, group_phrases in INTENT_ENTITIES.get(intent, []):
+            if trigger in found:
+                return intent, entity, any(phrase in found for phrase in group_phrases)
         
-        return f"SELECT COUNT(*) as count FROM {self.table_name}"
+        return intent, '', False
     
-    def _generate_select_query(self, question: str) -> str:
-        """Generate SELECT queries"""
-        if 'company' in question:
-            return f"SELECT DISTINCT company FROM {self.table_name} WHERE company IS NOT NULL AND company != '0' AND company != '' ORDER BY company"
-        elif 'region' in question:
-            return f"SELECT DISTINCT region FROM {self.table_name} WHERE region IS NOT NULL AND region != '0' AND region != '' ORDER BY region"
-        elif 'customer' in question:
-            return f"SELECT DISTINCT customer FROM {self.table_name} WHERE customer IS NOT NULL AND customer != '0' AND customer != '' ORDER BY customer"
-        elif 'plant' in question:
-            return f"SELECT DISTINCT plant FROM {self.table_name} WHERE plant IS NOT NULL AND plant != '0' AND plant != '' ORDER BY plant"
-        else:
-            return f"SELECT * FROM {self.table_name} LIMIT 10"
-    
-    def _generate_max_query(self, question: str) -> str:
-        """Generate MAX queries"""
-        budget_columns = [col for col in self.schema.keys() if 'budget' in col or 'total' in col or 'value' in col]
+    def _natural_language_to_sql(self, question: str) -> Tuple[str, Tuple[Any, ...]]:
+        """
+        Convert natural language question to SQL query and its parameters
+        This is a simplified NLP to SQL converter
+        """
+        question = question.lower().strip()
         
-        if budget_columns:
-            main_budget_col = budget_columns[0]
-            return f"SELECT *, MAX(CAST({main_budget_col} AS REAL)) as max_value FROM {self.table_name}"
+        intent, entity, grouped = self._parse_question(question)
+        query_key = QUERY_TABLE[intent, entity, grouped]
         
-        return f"SELECT * FROM {self.table_name} LIMIT 1"
+        if query_key not in self._queries:
+            query_key = QUERY_FALLBACK[intent]
+        return self._queries[query_key]
     
-    def _generate_min_query(self, question: str) -> str:
-        """Generate MIN queries"""
-        budget_columns = [col for col in self.schema.keys() if 'budget' in col or 'total' in col or 'value' in col]
+    def _build_queries(self) -> Dict[Tuple[str, str], Tuple[str, Tuple[Any, ...]]]:
+        """
+        Render every query shape once, keyed by (shape, column), together
+        with its bind parameters. Questions are answered with these exact
+        strings, so SQLite's per-connection statement cache can reuse the
+        compiled statements.
+        """
+        table = self.table_name
+        queries = {
+            ('count', ''): (SQL_COUNT_ALL.format(table=table), ()),
+            ('sample', ''): (SQL_SAMPLE_ROWS.format(table=table), ()),
+            ('first', ''): (SQL_FIRST_ROW.format(table=table), ()),
+        }
+        for col in ENTITY_COLUMNS:
+            queries['count', col] = (SQL_COUNT_NON_EMPTY.format(table=table, col=col), EMPTY_VALUES)
+            queries['count_by', col] = (SQL_COUNT_BY.format(table=table, col=col), EMPTY_VALUES)
+            queries['distinct', col] = (SQL_DISTINCT.format(table=table, col=col), EMPTY_VALUES)
         
-        if budget_columns:
-            main_budget_col = budget_columns[0]
-            return f"SELECT *, MIN(CAST({main_budget_col} AS REAL)) as min_value FROM {self.table_name} WHERE CAST({main_budget_col} AS REAL) > 0"
+        if self._main_budget_col:
+            budget = self._numeric(self._main_budget_col)
+            queries['sum', ''] = (SQL_SUM_ALL.format(table=table, budget=budget), ())
+            queries['avg', ''] = (SQL_AVG_ALL.format(table=table, budget=budget), ())
+            queries['max', ''] = (SQL_MAX.format(table=table, budget=budget), ())
+            queries['min', ''] = (SQL_MIN.format(table=table, budget=budget), (0,))
+            for col in ENTITY_COLUMNS:
+                queries['sum_by', col] = (SQL_SUM_BY.format(table=table, col=col, budget=budget), EMPTY_VALUES)
+                queries['avg_by', col] = (SQL_AVG_BY.format(table=table, col=col, budget=budget), EMPTY_VALUES)
         
-        return f"SELECT * FROM {self.table_name} LIMIT 1"
+        return queries
     
-    def _generate_general_query(self, question: str) -> str:
-        """Generate general queries for unmatched patterns"""
-        return f"SELECT * FROM {self.table_name} LIMIT 10"
+    def _numeric(self, col: str) -> str:
+        """Reference a budget column as a number, casting only text columns"""
+        if self.schema.get(col) == 'REAL':
+            return col
+        return f"CAST({col} AS REAL)"
     
-    def execute_query(self, sql_query: str) -> pd.DataFrame:
+    def execute_query(self, sql_query: str, params: Tuple[Any, ...] = ()) -> pd.DataFrame:
         """
-        Execute SQL query and return results as DataFrame
+        Execute SQL query with optional bind parameters and return results as DataFrame
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            df = pd.read_sql_query(sql_query, conn)
-            conn.close()
-            return df
+            # Build the frame straight from the cursor rows, skipping read_sql_query's wrapper
+            cursor = self._conn.execute(sql_query, params)
+            columns = [description[0] for description in cursor.description]
+            return pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
         except Exception as e:
             print(f"Error executing query: {e}")
             return pd.DataFrame()
     
+    @staticmethod
+    def _recall(cache: OrderedDict, key):
+        """
+        Look up a cache entry and mark it as the most recently used
+        """
+        value = cache.get(key)
+        if value is not None:
+            try:
+                cache.move_to_end(key)
+            except KeyError:
+                # Evicted by another thread in the meantime
+                pass
+        return value
+    
+    @staticmethod
+    def _remember(cache: OrderedDict, key, value):
+        """
+        Add an entry to a bounded cache, dropping the oldest one when full
+        """
+        cache[key] = value
+        if len(cache) > QUERY_CACHE_SIZE:
+            cache.popitem(last=False)
+    
     def ask_question(self, question: str) -> Dict[str, Any]:
         """
         Main method to ask questions in natural language
@@ -174,13 +271,36 @@ class InvestmentDataChatbot:
         print(f"\nQuestion: {question}")
         print("-" * 50)
         
-        # Convert to SQL
-        sql_query = self._natural_language_to_sql(question)
-        print(f"Generated SQL: {sql_query}")
+        # Reuse the answer if the same question was already asked against this database
+        db_version = self._db_version()
+        cache_key = (question.lower().strip(), db_version)
+        cached = self._recall(self._cache, cache_key)
+        
+        if cached is not None:
+            sql_query, params, result_df = cached[0], cached[1], cached[2].copy()
+            from_cache = True
+        else:
+            # Convert to SQL
+            sql_query, params = self._natural_language_to_sql(question)
+            cached_df = self._recall(self._result_cache, (sql_query, params, db_version))
+            from_cache = cached_df is not None
+        
+        print(f"Generated SQL: {sql_query}{' (cached)' if from_cache else ''}")
+        if params:
+            print(f"Parameters: {list(params)}")
         print("-" * 50)
         
-        # Execute query
-        result_df = self.execute_query(sql_query)
+        if cached is None:
+            if from_cache:
+                result_df = cached_df.copy()
+            else:
+                # Execute query
+                result_df = self.execute_query(sql_query, params)
+            
+            if not result_df.empty:
+                stored_df = result_df.copy()
+                self._remember(self._cache, cache_key, (sql_query, params, stored_df))
+                self._remember(self._result_cache, (sql_query, params, db_version), stored_df)
         
         if not result_df.empty:
             print("Results:")
@@ -189,6 +309,7 @@ class InvestmentDataChatbot:
             return {
                 'question': question,
                 'sql_query': sql_query,
+                'sql_params': list(params),
                 'results': result_df,
                 'success': True
             }
@@ -197,6 +318,7 @@ class InvestmentDataChatbot:
             return {
                 'question': question,
                 'sql_query': sql_query,
+                'sql_params': list(params),
                 'results': pd.DataFrame(),
                 'success': False
             }
@@ -210,6 +332,12 @@ class InvestmentDataChatbot:
         for i, col in enumerate(self.schema.keys(), 1):
             print(f"{i:2d}. {col}")
     
+    def close(self):
+        """
+        Close the database connection
+        """
+        self._conn.close()
+    
     def interactive_mode(self):
         """
         Start interactive chatbot mode
@@ -225,6 +353,7 @@ class InvestmentDataChatbot:
             
             if question.lower() in ['quit', 'exit', 'bye']:
                 print("Goodbye!")
+                self.close()
                 break
             elif question.lower() == 'help':
                 self._show_help()
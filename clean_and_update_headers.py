@@ -8,42 +8,134 @@ import pandas as pd
 import sqlite3
 import numpy as np
 import os
+import re
 from datetime import datetime
+from openpyxl import load_workbook
+
+# Set EXCEL_DEBUG=1 for the detailed row-by-row and per-column diagnostics
+DEBUG = os.environ.get('EXCEL_DEBUG') == '1'
+
+# Optional: with pyarrow installed, text columns are held as Arrow-backed strings
+# (one shared buffer per column instead of a Python object per cell)
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = 'string[pyarrow]'
+except ImportError:
+    STRING_DTYPE = str
+
+# Strings pandas' readers treat as missing by default (keeps Excel and CSV loads consistent)
+EXCEL_NA_VALUES = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+
+# Excel error values (these are definitely not real data)
+EXCEL_ERROR_VALUES = ['#VALUE!', '#REF!', '#DIV/0!', '#N/A', '#NAME?', '#NULL!', '#NUM!']
+
+# Cell values that mean "no data": pandas' NaN spellings and Excel error values
+BLANK_VALUES = ['nan', 'NaN', '<NA>', 'None', ''] + EXCEL_ERROR_VALUES
+
+# Text that marks instruction/format rows between the header and the data
+INSTRUCTION_INDICATORS = [
+    'mandatory', 'optional', 'select', 'input', 'formula', 'linked',
+    'default', 'fill in', 'do not add', 'delete', 'collumn'
+]
+
+# Header names that usually hold amounts: budget/total/value columns,
+# monthly (april_2025, 2025_04_01_...) and yearly (2026_2027, plan_2027_28) figures
+BUDGET_COLUMN_PATTERN = re.compile(
+    r'budget|total|value|sum|plan_\d{4}|^\d{4}_\d{2}_\d{2}|^\d{4}_\d{4}$|'
+    r'(jan|feb|march|april|may|june|july|aug|sept|oct|nov|dec)_\d{4}'
+)
+
+def read_excel_rows(path):
+    """
+    Stream the first sheet of a workbook as tuples of cell values,
+    converting cells the same way pd.read_excel does (blanks, NA strings
+    and error cells become NaN, whole floats become ints)
+    """
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            cells = []
+            for value in row:
+                if value is None or (isinstance(value, str) and (value in EXCEL_NA_VALUES or value in EXCEL_ERROR_VALUES)):
+                    value = np.nan
+                elif isinstance(value, float) and value.is_integer():
+                    value = int(value)
+                cells.append(value)
+            yield tuple(cells)
+    finally:
+        workbook.close()
+
+def load_excel(path):
+    """
+    Build the raw sheet DataFrame from streamed rows, without pandas' parser pass
+    """
+    rows = list(read_excel_rows(path))
+    
+    # Drop trailing empty rows, like pd.read_excel
+    while rows and all(pd.isna(value) for value in rows[-1]):
+        rows.pop()
+    
+    return pd.DataFrame(rows)
 
 def analyze_raw_data(df):
     """
     Analyze the raw data structure very carefully
     """
+    # Purely diagnostic - skip the scan entirely unless debugging
+    if not DEBUG:
+        return df
+    
     print("🔍 DETAILED FILE ANALYSIS")
     print("=" * 50)
     print(f"File dimensions: {df.shape[0]} rows × {df.shape[1]} columns")
     
+    # Classify the cells of the first 20 rows in one pass per column
+    head = df.head(20)
+    missing = head.isna()
+    head_text = head.astype(str)
+    empty = missing | head_text.apply(lambda s: s.str.strip() == '')
+    numeric = ~missing & head_text.apply(lambda s: s.str.replace(r'[.,\-]', '', regex=True).str.isdigit())
+    empty_counts = empty.sum(axis=1)
+    numeric_counts = numeric.sum(axis=1)
+    
+    # Score each row as a potential header
+    row_texts = head_text.where(~missing, '').agg(' '.join, axis=1).str.lower()
+    header_indicators = ['company', 'region', 'plant', 'customer', 'description', 'investment', 'budget']
+    header_scores = sum(row_texts.str.contains(indicator, regex=False).astype(int) for indicator in header_indicators)
+    
     # Analyze each of the first 20 rows in detail
     print("\nDetailed row-by-row analysis:")
-    for i in range(min(20, len(df))):
-        row = df.iloc[i]
-        
+    for i in range(len(head)):
         # Count different types of values
-        total_cells = len(row)
-        empty_cells = sum(1 for val in row if pd.isna(val) or str(val).strip() == '')
-        numeric_cells = sum(1 for val in row if pd.notna(val) and str(val).replace('.', '').replace('-', '').replace(',', '').isdigit())
+        total_cells = head.shape[1]
+        empty_cells = int(empty_counts.iloc[i])
+        numeric_cells = int(numeric_counts.iloc[i])
         text_cells = total_cells - empty_cells - numeric_cells
         
         # Get first few non-empty values
-        non_empty_values = [str(val)[:15] for val in row if pd.notna(val) and str(val).strip() != ''][:5]
+        non_empty_values = head_text.iloc[i][~empty.iloc[i]].str[:15].tolist()[:5]
         
         print(f"Row {i:2d}: Empty={empty_cells:3d}, Numeric={numeric_cells:3d}, Text={text_cells:3d} | Sample: {non_empty_values}")
         
         # Check if this looks like a header row
-        row_text = ' '.join(str(val) for val in row if pd.notna(val)).lower()
-        header_indicators = ['company', 'region', 'plant', 'customer', 'description', 'investment', 'budget']
-        header_score = sum(1 for indicator in header_indicators if indicator in row_text)
+        header_score = int(header_scores.iloc[i])
         
         if header_score >= 3:
             print(f"    ⭐ POTENTIAL HEADER ROW (score: {header_score}/7)")
     
     return df
 
+def row_text_series(df):
+    """
+    Join the non-empty values of each row into one lowercase string
+    """
+    if df.empty:
+        return pd.Series(dtype=str)
+    return df.astype(str).where(df.notna(), '').agg(' '.join, axis=1).str.lower()
+
 def find_data_boundaries(df):
     """
     Very carefully identify where headers and data start
@@ -55,42 +147,37 @@ def find_data_boundaries(df):
     data_start_row = None
     
     # Look for header row with multiple key indicators
-    for i in range(min(25, len(df))):
-        row_values = [str(val).lower() for val in df.iloc[i] if pd.notna(val)]
-        row_text = ' '.join(row_values)
-        
-        # Score this row as potential header
-        header_indicators = {
-            'id': 'id' in row_text and ('change' in row_text or 'delete' in row_text),
-            'company': 'company' in row_text,
-            'region': 'region' in row_text,
-            'plant': 'plant' in row_text,
-            'customer': 'customer' in row_text,
-            'description': 'description' in row_text,
-            'investment': 'investment' in row_text,
-            'budget': 'budget' in row_text
+    row_texts = row_text_series(df.head(25))
+    
+    # Score every row as potential header at once
+    header_indicators = pd.DataFrame({
+        'id': row_texts.str.contains('id', regex=False) & (
+            row_texts.str.contains('change', regex=False) | row_texts.str.contains('delete', regex=False)
+        ),
+        **{
+            indicator: row_texts.str.contains(indicator, regex=False)
+            for indicator in ['company', 'region', 'plant', 'customer', 'description', 'investment', 'budget']
         }
-        
-        score = sum(header_indicators.values())
-        
-        if score >= 4:  # Need at least 4 key indicators
-            header_row = i
-            print(f"✅ Header row identified at row {i} (score: {score}/8)")
-            print(f"   Indicators found: {[k for k, v in header_indicators.items() if v]}")
-            break
+    })
+    scores = header_indicators.sum(axis=1)
+    
+    candidates = scores.index[scores >= 4]  # Need at least 4 key indicators
+    if len(candidates) > 0:
+        header_row = int(candidates[0])
+        print(f"✅ Header row identified at row {header_row} (score: {scores[header_row]}/8)")
+        print(f"   Indicators found: {header_indicators.columns[header_indicators.loc[header_row]].tolist()}")
     
     if header_row is None:
         print("⚠️  No clear header row found, using heuristic approach...")
         # Look for row with highest data density
-        max_density = 0
-        for i in range(min(15, len(df))):
-            non_empty = sum(1 for val in df.iloc[i] if pd.notna(val) and str(val).strip() != '')
-            density = non_empty / len(df.columns)
-            if density > max_density and density > 0.3:
-                max_density = density
-                header_row = i
+        top = df.head(15)
+        non_empty = (top.notna() & top.astype(str).apply(lambda s: s.str.strip() != '')).sum(axis=1)
+        densities = non_empty / len(df.columns)
+        dense_rows = densities[densities > 0.3]
         
-        if header_row is not None:
+        if not dense_rows.empty:
+            header_row = int(dense_rows.idxmax())
+            max_density = dense_rows.max()
             print(f"📊 Using row {header_row} as header (density: {max_density:.2%})")
         else:
             header_row = 8  # Safe fallback
@@ -100,17 +187,12 @@ def find_data_boundaries(df):
     data_start_row = header_row + 1
     
     # Skip instruction/format rows
-    for i in range(data_start_row, min(data_start_row + 10, len(df))):
-        row_values = [str(val).lower() for val in df.iloc[i] if pd.notna(val)]
-        row_text = ' '.join(row_values)
-        
-        # Check if this looks like an instruction row
-        instruction_indicators = [
-            'mandatory', 'optional', 'select', 'input', 'formula', 'linked',
-            'default', 'fill in', 'do not add', 'delete', 'collumn'
-        ]
-        
-        if any(indicator in row_text for indicator in instruction_indicators):
+    instruction_pattern = '|'.join(re.escape(indicator) for indicator in INSTRUCTION_INDICATORS)
+    following_texts = row_text_series(df.iloc[data_start_row:data_start_row + 10])
+    is_instruction = following_texts.str.contains(instruction_pattern, regex=True)
+    
+    for i, instruction_row in is_instruction.items():
+        if instruction_row:
             data_start_row = i + 1
             print(f"⏭️  Skipping instruction row {i}")
         else:
@@ -221,41 +303,28 @@ def ultra_careful_cleaning(df):
     print("=" * 50)
     
     original_shape = df.shape
-    changes_made = 0
     
-    # Convert entire dataframe to string first to avoid type issues
-    df = df.astype(str)
+    # Numeric columns stay numeric - only their missing values need filling
+    numeric_cols = df.select_dtypes(include=[np.number]).columns
+    numeric = df[numeric_cols]
+    numeric_mask = numeric.isna()
     
-    for col in df.columns:
-        col_changes = 0
-        
-        # Replace pandas string representations of NaN
-        nan_representations = ['nan', 'NaN', '<NA>', 'None']
-        for nan_val in nan_representations:
-            nan_mask = df[col] == nan_val
-            col_changes += nan_mask.sum()
-            df.loc[nan_mask, col] = '0'
-        
-        # Only replace truly empty strings
-        empty_mask = df[col] == ''
-        col_changes += empty_mask.sum()
-        df.loc[empty_mask, col] = '0'
-        
-        # Replace whitespace-only strings
-        whitespace_mask = df[col].str.strip() == ''
-        col_changes += whitespace_mask.sum()
-        df.loc[whitespace_mask, col] = '0'
-        
-        # Replace clear Excel error values (these are definitely not real data)
-        error_values = ['#VALUE!', '#REF!', '#DIV/0!', '#N/A', '#NAME?', '#NULL!', '#NUM!']
-        for error_val in error_values:
-            error_mask = df[col] == error_val
-            col_changes += error_mask.sum()
-            df.loc[error_mask, col] = '0'
-        
-        changes_made += col_changes
-        
-        if col_changes > 0:
+    # Convert only the remaining columns to string to avoid type issues
+    text = df[df.columns.difference(numeric_cols, sort=False)].astype(STRING_DTYPE)
+    
+    # One mask for everything that is blank: missing values (Arrow-backed strings keep
+    # NaN as missing), pandas string representations of NaN, empty/whitespace-only
+    # strings and clear Excel error values (these are definitely not real data)
+    stripped = text.apply(lambda s: s.str.strip())
+    blank_mask = text.isna() | text.isin(BLANK_VALUES) | (stripped == '')
+    
+    df = pd.concat([numeric.fillna(0), text.mask(blank_mask, '0')], axis=1)[df.columns]
+    
+    column_changes = pd.concat([numeric_mask.sum(), blank_mask.sum()])[df.columns]
+    changes_made = int(column_changes.sum())
+    
+    if DEBUG:
+        for col, col_changes in column_changes[column_changes > 0].items():
             print(f"  {col}: {col_changes} empty values → 0")
     
     print(f"✅ Total changes: {changes_made} empty values replaced with 0")
@@ -263,6 +332,27 @@ def ultra_careful_cleaning(df):
     
     return df
 
+def find_numeric_columns(df):
+    """
+    Find numeric columns and budget-like columns that only hold numbers,
+    so they can be stored as REAL
+    """
+    numeric_columns = []
+    
+    for col in df.columns:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            numeric_columns.append(col)
+            continue
+        if not BUDGET_COLUMN_PATTERN.search(col):
+            continue
+        # Keep the column as text if any value is not a number - never drop real data
+        if pd.to_numeric(df[col], errors='coerce').notna().all():
+            numeric_columns.append(col)
+    
+    print(f"🔢 {len(numeric_columns)} numeric columns will be stored as REAL")
+    
+    return numeric_columns
+
 def extract_actual_data(df, data_start_row):
     """
     Extract only the actual data rows, being very careful
@@ -279,18 +369,10 @@ def extract_actual_data(df, data_start_row):
     # Check first 5 columns for any meaningful content
     key_columns = min(5, len(data_df.columns))
     
-    # Create mask for rows with actual data
-    has_data_mask = pd.Series([False] * len(data_df))
-    
-    for i in range(key_columns):
-        col_values = data_df.iloc[:, i].astype(str)
-        # Row has data if any of the first 5 columns has non-zero, non-empty content
-        has_data_mask = has_data_mask | (
-            (col_values.str.strip() != '') & 
-            (col_values != '0') & 
-            (col_values != 'nan') &
-            (col_values != 'NaN')
-        )
+    # Row has data if any of the first 5 columns has non-zero, non-empty content
+    block = data_df.iloc[:, :key_columns].astype(str).to_numpy(dtype=str)
+    no_content = np.isin(block, ['0', 'nan', 'NaN']) | (np.char.strip(block) == '')
+    has_data_mask = ~no_content.all(axis=1)
     
     # Keep rows with actual data
     filtered_df = data_df[has_data_mask].reset_index(drop=True)
@@ -311,7 +393,7 @@ def main():
     print("\n1️⃣ READING FILE...")
     try:
         if os.path.exists('Anushka - Intern Assignment-Data.xlsx'):
-            df = pd.read_excel('Anushka - Intern Assignment-Data.xlsx', header=None)
+            df = load_excel('Anushka - Intern Assignment-Data.xlsx')
             print("✅ Excel file loaded successfully")
         elif os.path.exists('Anushka - Intern Assignment-Data.csv'):
             df = pd.read_csv('Anushka - Intern Assignment-Data.csv', header=None)
@@ -343,18 +425,26 @@ def main():
     # Step 6: Clean data carefully
     print(f"\n6️⃣ CLEANING DATA...")
     data_df = ultra_careful_cleaning(data_df)
+    numeric_columns = find_numeric_columns(data_df)
+    for col in numeric_columns:
+        # Parse with astype rather than to_numeric: to_numeric's fast parser is not
+        # round-trip exact and would change the stored values
+        data_df[col] = data_df[col].astype('float64').fillna(0.0)
     
     # Step 7: Create database
     print(f"\n7️⃣ CREATING DATABASE...")
     try:
         conn = sqlite3.connect('investment_data_careful.db')
+        # WAL lets the web app read while the database is rebuilt; the mode is stored
+        # in the file, so readers never have to switch it themselves
+        conn.execute('PRAGMA journal_mode=WAL')
         cursor = conn.cursor()
         
         # Drop existing table
         cursor.execute('DROP TABLE IF EXISTS investment_projects')
         
         # Create table
-        columns_def = [f'"{col}" TEXT' for col in data_df.columns]
+        columns_def = [f'"{col}" REAL' if col in numeric_columns else f'"{col}" TEXT' for col in data_df.columns]
         create_table_sql = f'''
         CREATE TABLE investment_projects (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -366,12 +456,49 @@ def main():
         cursor.execute(create_table_sql)
         print("✅ Database table created")
         
-        # Insert data
-        data_df.to_sql('investment_projects', conn, if_exists='append', index=False)
-        conn.commit()
+        # Insert data - all rows in a single transaction
+        columns_sql = ', '.join(f'"{col}"' for col in data_df.columns)
+        placeholders = ', '.join('?' for _ in data_df.columns)
+        with conn:
+            cursor.executemany(
+                f'INSERT INTO investment_projects ({columns_sql}) VALUES ({placeholders})',
+                data_df.itertuples(index=False, name=None)
+            )
         
         print(f"✅ {len(data_df)} records inserted successfully")
         
+        # Index the columns the chatbot filters and groups by
+        for col in ['company', 'region', 'customer', 'plant']:
+            if col in data_df.columns:
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{col} ON investment_projects("{col}")')
+        
+        # Covering indexes for "budget by company/region" (same column choice as the chatbot)
+        budget_columns = [col for col in data_df.columns if 'budget' in col or 'total' in col or 'value' in col]
+        if budget_columns:
+            main_budget_col = budget_columns[0]
+            for col in ['company', 'region']:
+                if col in data_df.columns:
+                    cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{col}_budget ON investment_projects("{col}", "{main_budget_col}")')
+        
+        cursor.execute('ANALYZE')
+        conn.commit()
+        print("✅ Query indexes created")
+        
+        # Precompute the web app's /stats counts so it does not have to scan the table
+        stats = {'total_projects': len(data_df)}
+        for key, col in [('unique_companies', 'company'), ('unique_regions', 'region')]:
+            if col in data_df.columns:
+                cursor.execute(
+                    f'SELECT COUNT(DISTINCT "{col}") FROM investment_projects WHERE "{col}" IS NOT NULL AND "{col}" NOT IN (?, ?)',
+                    ('0', '')
+                )
+                stats[key] = cursor.fetchone()[0]
+        with conn:
+            cursor.execute('DROP TABLE IF EXISTS stats_cache')
+            cursor.execute('CREATE TABLE stats_cache (key TEXT PRIMARY KEY, value INTEGER)')
+            cursor.executemany('INSERT INTO stats_cache (key, value) VALUES (?, ?)', stats.items())
+        print("✅ Statistics cached")
+        
         # Validate
         cursor.execute("SELECT COUNT(*) FROM investment_projects")
         count = cursor.fetchone()[0]
@@ -1,15 +1,96 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request
+from flask_compress import Compress
+from werkzeug.exceptions import HTTPException
+import orjson
+import os
+import queue
 import sqlite3
-import pandas as pd
-import numpy as np
-from chatbot import InvestmentDataChatbot
-import json
+import time
+from functools import lru_cache
+from chatbot import InvestmentDataChatbot, tune_connection
 
 app = Flask(__name__)
 
+# Compress larger responses (Brotli when the client accepts it, else gzip)
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 1024
+app.config['COMPRESS_LEVEL'] = 4
+app.config['COMPRESS_BR_LEVEL'] = 4
+# Leave /ask_stream uncompressed so rows reach the client as they are produced
+app.config['COMPRESS_STREAMS'] = False
+Compress(app)
+
 # Initialize chatbot
 chatbot = InvestmentDataChatbot()
 
+# The schema is read once at startup, so the column list is serialized once too
+_COLUMNS_JSON = orjson.dumps({'columns': list(chatbot.schema.keys())})
+
+def _json_response(obj, status=200):
+    """
+    Serialize a response body with orjson (NaN and NumPy values included)
+    """
+    return app.response_class(
+        orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS),
+        status=status,
+        mimetype='application/json'
+    )
+
+# Rows converted to Python objects at a time when building records
+RECORDS_CHUNK_ROWS = 1000
+
+def _iter_records(df):
+    """
+    Yield a DataFrame's rows as dicts, converting RECORDS_CHUNK_ROWS rows at a time
+    """
+    # DataFrame.to_json is no faster here once orjson does the encoding, and it
+    # rounds floats to at most 15 significant digits, which changes budget values.
+    # Going through pyarrow (Table.from_pandas(df).to_pylist()) is several times slower.
+    columns = list(df.columns)
+    for start in range(0, len(df), RECORDS_CHUNK_ROWS):
+        chunk = df.iloc[start:start + RECORDS_CHUNK_ROWS]
+        for row in zip(*[chunk[col].tolist() for col in columns]):
+            yield dict(zip(columns, row))
+
+def _records(df):
+    """
+    Convert a DataFrame to a list of row dicts
+    """
+    return list(_iter_records(df))
+
+# Reusable read connections for /stats
+STATS_POOL_SIZE = 4
+
+def _open_stats_connection():
+    """
+    Open a read connection for the stats pool
+    """
+    conn = sqlite3.connect(chatbot.db_path, check_same_thread=False, isolation_level=None)
+    return tune_connection(conn, cache_size=-20000)
+
+stats_pool = queue.Queue(maxsize=STATS_POOL_SIZE)
+for _ in range(STATS_POOL_SIZE):
+    stats_pool.put(_open_stats_connection())
+
+# Body of every 500 response; the exception itself is only logged
+_INTERNAL_ERROR_JSON = orjson.dumps({'error': 'Internal server error'})
+
+@app.errorhandler(Exception)
+def handle_exception(e):
+    """
+    Return every error as JSON; unexpected errors are logged and get a generic 500
+    """
+    # HTTP errors (404, 405, bad or non-JSON request bodies) keep their status code
+    if isinstance(e, HTTPException):
+        response = _json_response({'error': e.description}, e.code)
+        # Keep headers such as Allow on 405 responses
+        for name, value in e.get_headers():
+            if name.lower() != 'content-type':
+                response.headers[name] = value
+        return response
+    app.logger.exception("Unhandled error on %s", request.path)
+    return app.response_class(_INTERNAL_ERROR_JSON, status=500, mimetype='application/json')
+
 @app.route('/')
 def index():
     """
@@ -17,106 +98,157 @@ def index():
     """
     return render_template('index.html')
 
+# Largest result rendered as an HTML table by /ask
+HTML_MAX_ROWS = 500
+
+# Result fields for an /ask that found nothing, per format
+_EMPTY_RESULTS = {
+    'json': {'results_json': []},
+    'html': {'results_html': '<p>No results found.</p>', 'results_truncated': False, 'results_total': 0}
+}
+
 @app.route('/ask', methods=['POST'])
 def ask_question():
     """
     API endpoint to handle questions
     """
-    try:
-        data = request.get_json()
-        question = data.get('question', '')
-        
-        if not question:
-            return jsonify({'error': 'No question provided'}), 400
-        
-        # Get response from chatbot
-        response = chatbot.ask_question(question)
-        
-        # Convert DataFrame to JSON if results exist
-        if response['success'] and not response['results'].empty:
-            # Replace NaN values with None (which becomes null in JSON)
-            clean_df = response['results'].replace({np.nan: None})
-            results_json = clean_df.to_dict('records')
-            response['results_json'] = results_json
-            response['results_html'] = response['results'].to_html(classes='table table-striped', index=False)
-        else:
-            response['results_json'] = []
-            response['results_html'] = '<p>No results found.</p>'
-        
-        # Remove the DataFrame object for JSON serialization
-        del response['results']
-        
-        return jsonify(response)
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    data = request.get_json()
+    question = data.get('question', '')
+    fmt = data.get('format', 'json')
+    
+    if not question:
+        return _json_response({'error': 'No question provided'}, 400)
+    if fmt not in ('json', 'html'):
+        return _json_response({'error': "format must be 'json' or 'html'"}, 400)
+    
+    # Get response from chatbot
+    response = chatbot.ask_question(question)
+    
+    # Take the DataFrame out of the response; only the rendered results are serialized
+    df = response.pop('results')
+    nrows = len(df)
+    
+    if not (response['success'] and nrows):
+        response.update(_EMPTY_RESULTS[fmt])
+    elif fmt == 'html':
+        # Only the first HTML_MAX_ROWS rows are rendered as HTML
+        truncated = nrows > HTML_MAX_ROWS
+        html_df = df.head(HTML_MAX_ROWS) if truncated else df
+        response['results_html'] = html_df.to_html(classes='table table-striped', index=False)
+        response['results_truncated'] = truncated
+        response['results_total'] = nrows
+    else:
+        # NaN values are written as null by the JSON encoder
+        response['results_json'] = _records(df)
+    
+    return _json_response(response)
+
+@app.route('/ask_stream', methods=['POST'])
+def ask_question_stream():
+    """
+    API endpoint that streams results as NDJSON: a header line, then one line per row
+    """
+    data = request.get_json()
+    question = data.get('question', '')
+    
+    if not question:
+        return _json_response({'error': 'No question provided'}, 400)
+    
+    response = chatbot.ask_question(question)
+    df = response.pop('results')
+    
+    def generate():
+        yield orjson.dumps(response) + b'\n'
+        if not response['success']:
+            return
+        for record in _iter_records(df):
+            yield orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY) + b'\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
 
 @app.route('/columns')
 def get_columns():
     """
     Get available columns
     """
+    return app.response_class(_COLUMNS_JSON, mimetype='application/json')
+
+# Seconds a computed /stats result is served from memory
+STATS_TTL_SECONDS = 60
+
+# Counts stored in the stats_cache table built by clean_and_update_headers.py
+STATS_KEYS = ('total_projects', 'unique_companies', 'unique_regions')
+
+# Fallback query for databases without stats_cache, built once with the table name quoted
+_STATS_TABLE = '"' + chatbot.table_name.replace('"', '""') + '"'
+_STATS_SQL = f"""
+    SELECT COUNT(*),
+           COUNT(DISTINCT CASE WHEN company IS NOT NULL AND company NOT IN ('0', '') THEN company END),
+           COUNT(DISTINCT CASE WHEN region IS NOT NULL AND region NOT IN ('0', '') THEN region END)
+    FROM {_STATS_TABLE}
+"""
+
+@lru_cache(maxsize=1)
+def _compute_stats(time_bucket):
+    """
+    Query the database statistics; cached per time bucket
+    """
+    conn = stats_pool.get()
     try:
-        return jsonify({'columns': list(chatbot.schema.keys())})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        cursor = conn.cursor()
+        try:
+            stats = dict(cursor.execute("SELECT key, value FROM stats_cache").fetchall())
+        except sqlite3.OperationalError:
+            # Database was built without the stats_cache table
+            stats = {}
+        
+        if not all(key in stats for key in STATS_KEYS):
+            # Get row count, unique companies and unique regions in one pass
+            cursor.execute(_STATS_SQL)
+            stats = dict(zip(STATS_KEYS, cursor.fetchone()))
+    finally:
+        stats_pool.put(conn)
+    
+    return {
+        'total_projects': stats['total_projects'],
+        'unique_companies': stats['unique_companies'],
+        'unique_regions': stats['unique_regions'],
+        'total_columns': len(chatbot.schema)
+    }
 
 @app.route('/stats')
 def get_stats():
     """
     Get database statistics
     """
-    try:
-        conn = sqlite3.connect(chatbot.db_path)
-        
-        # Get row count
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT COUNT(*) FROM {chatbot.table_name}")
-        row_count = cursor.fetchone()[0]
-        
-        # Get unique companies
-        cursor.execute(f"SELECT COUNT(DISTINCT company) FROM {chatbot.table_name} WHERE company IS NOT NULL AND company != '0' AND company != ''")
-        company_count = cursor.fetchone()[0]
-        
-        # Get unique regions
-        cursor.execute(f"SELECT COUNT(DISTINCT region) FROM {chatbot.table_name} WHERE region IS NOT NULL AND region != '0' AND region != ''")
-        region_count = cursor.fetchone()[0]
-        
-        conn.close()
-        
-        stats = {
-            'total_projects': row_count,
-            'unique_companies': company_count,
-            'unique_regions': region_count,
-            'total_columns': len(chatbot.schema)
-        }
-        
-        return jsonify(stats)
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    stats = _compute_stats(int(time.time() // STATS_TTL_SECONDS))
+    
+    return _json_response(stats)
+
+# Sample questions for the UI, serialized once
+SAMPLE_QUESTIONS = [
+    "How many projects are there?",
+    "Count projects by company",
+    "Show all companies",
+    "List all regions",
+    "What is the total budget?",
+    "Show projects by region",
+    "Count projects by customer",
+    "What is the average budget by company?",
+    "Show the project with maximum budget",
+    "List all customers",
+    "Show all plants",
+    "Count projects by investment category"
+]
+_SAMPLE_QUESTIONS_JSON = orjson.dumps({'questions': SAMPLE_QUESTIONS})
 
 @app.route('/sample_questions')
 def get_sample_questions():
     """
     Get sample questions for the UI
     """
-    sample_questions = [
-        "How many projects are there?",
-        "Count projects by company",
-        "Show all companies",
-        "List all regions",
-        "What is the total budget?",
-        "Show projects by region",
-        "Count projects by customer",
-        "What is the average budget by company?",
-        "Show the project with maximum budget",
-        "List all customers",
-        "Show all plants",
-        "Count projects by investment category"
-    ]
-    
-    return jsonify({'questions': sample_questions})
+    return app.response_class(_SAMPLE_QUESTIONS_JSON, mimetype='application/json')
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Development server only; see README for running under gunicorn
+    app.run(debug=os.getenv('FLASK_DEBUG') == '1', threaded=True, host='0.0.0.0', port=5000)
\ No newline at end of file